@@ -1,6 +1,7 @@
 import os
 import json
-import subprocess
+import shutil
+from functools import lru_cache
 import edge_tts
 from edge_tts import submaker
 from pydub import AudioSegment
@@ -9,13 +10,13 @@ from loguru import logger
 from app.utils import utils
 
 
+@lru_cache(maxsize=1)
 def check_ffmpeg():
-    """检查FFmpeg是否已安装"""
-    try:
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return True
-    except FileNotFoundError:
-        return False
+    """检查FFmpeg是否已安装，结果在进程内缓存
+
+    只在 PATH 中查找可执行文件，无需启动 ffmpeg 进程
+    """
+    return shutil.which('ffmpeg') is not None
 
 
 def merge_audio_files(task_id: str, audio_files: list, total_duration: float, list_script: list):
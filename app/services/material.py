@@ -2,6 +2,7 @@ import os
 import subprocess
 import random
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 from datetime import datetime
 
@@ -456,44 +457,56 @@ def merge_videos(video_paths, ost_list):
     if not video_paths:
         raise ValueError("视频路径列表不能为空")
 
-    # 准备临时文件列表
+    # 不保留原声的片段需要先生成无声的临时视频，各片段互不依赖，并行执行
+    # 临时文件名带上片段序号，同名片段不会写入同一个文件
+    silent_videos = {
+        i: f"silent_{i}_{os.path.basename(video_path)}"
+        for i, (video_path, keep_ost) in enumerate(zip(video_paths, ost_list))
+        if not keep_ost
+    }
     temp_file = "temp_file_list.txt"
-    with open(temp_file, "w") as f:
-        for video_path, keep_ost in zip(video_paths, ost_list):
-            if keep_ost:
-                f.write(f"file '{video_path}'\n")
-            else:
-                # 如果不保留原声，创建一个无声的临时视频
-                silent_video = f"silent_{os.path.basename(video_path)}"
-                subprocess.run(["ffmpeg", "-i", video_path, "-c:v", "copy", "-an", silent_video], check=True)
-                f.write(f"file '{silent_video}'\n")
-
-    # 合并视频
     output_file = "combined.mp4"
-    ffmpeg_cmd = [
-        "ffmpeg",
-        "-f", "concat",
-        "-safe", "0",
-        "-i", temp_file,
-        "-c:v", "copy",
-        "-c:a", "aac",
-        "-strict", "experimental",
-        output_file
-    ]
-
     try:
-        subprocess.run(ffmpeg_cmd, check=True)
-        print(f"视频合并成功：{output_file}")
-    except subprocess.CalledProcessError as e:
-        print(f"视频合并失败：{e}")
-        return None
+        if silent_videos:
+            with ThreadPoolExecutor(max_workers=min(len(silent_videos), os.cpu_count() or 1)) as executor:
+                futures = [
+                    executor.submit(
+                        subprocess.run,
+                        ["ffmpeg", "-nostdin", "-y", "-i", video_paths[i], "-c:v", "copy", "-an", silent_video],
+                        check=True
+                    )
+                    for i, silent_video in silent_videos.items()
+                ]
+                for future in futures:
+                    future.result()
+
+        # 准备临时文件列表
+        with open(temp_file, "w") as f:
+            for i, video_path in enumerate(video_paths):
+                f.write(f"file '{silent_videos.get(i, video_path)}'\n")
+
+        # 合并视频
+        ffmpeg_cmd = [
+            "ffmpeg",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", temp_file,
+            "-c:v", "copy",
+            "-c:a", "aac",
+            "-strict", "experimental",
+            output_file
+        ]
+
+        try:
+            subprocess.run(ffmpeg_cmd, check=True)
+            print(f"视频合并成功：{output_file}")
+        except subprocess.CalledProcessError as e:
+            print(f"视频合并失败：{e}")
+            return None
     finally:
-        # 清理临时文件
-        os.remove(temp_file)
-        for video_path, keep_ost in zip(video_paths, ost_list):
-            if not keep_ost:
-                silent_video = f"silent_{os.path.basename(video_path)}"
-                if os.path.exists(silent_video):
-                    os.remove(silent_video)
+        # 清理临时文件，某个片段处理失败时也删除其他片段已生成的无声视频
+        for path in [temp_file, *silent_videos.values()]:
+            if os.path.exists(path):
+                os.remove(path)
 
     return output_file
@@ -152,6 +152,7 @@ class ScriptGenerator:
         analyzer = gemini_analyzer.VisionAnalyzer(
             model_name=vision_model,
             api_key=vision_api_key,
+            concurrency=config.frames.get("vision_concurrency", 3),
         )
 
         progress_callback(40, "正在分析关键帧...")
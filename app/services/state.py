@@ -41,8 +41,8 @@ class MemoryState(BaseState):
         return self._tasks.get(task_id, None)
 
     def delete_task(self, task_id: str):
-        if task_id in self._tasks:
-            del self._tasks[task_id]
+        # 单次 pop 是原子操作，避免检查与删除之间被其他线程抢先删除
+        self._tasks.pop(task_id, None)
 
 
 # Redis state management
@@ -1,10 +1,10 @@
 import json
 import os.path
 import re
+import threading
 import traceback
 from typing import Optional
 
-from faster_whisper import WhisperModel
 from timeit import default_timer as timer
 from loguru import logger
 import google.generativeai as genai
@@ -18,6 +18,7 @@ model_size = config.whisper.get("model_size", "faster-whisper-large-v2")
 device = config.whisper.get("device", "cpu")
 compute_type = config.whisper.get("compute_type", "int8")
 model = None
+_model_lock = threading.Lock()
 
 
 def create(audio_file, subtitle_file: str = ""):
@@ -33,57 +34,63 @@ def create(audio_file, subtitle_file: str = ""):
     """
     global model, device, compute_type
     if not model:
-        model_path = f"{utils.root_dir()}/app/models/faster-whisper-large-v2"
-        model_bin_file = f"{model_path}/model.bin"
-        if not os.path.isdir(model_path) or not os.path.isfile(model_bin_file):
-            logger.error(
-                "请先下载 whisper 模型\n\n"
-                "********************************************\n"
-                "下载地址：https://huggingface.co/guillaumekln/faster-whisper-large-v2\n"
-                "存放路径：app/models \n"
-                "********************************************\n"
-            )
-            return None
+        # 双重检查加锁，避免并发首次调用时重复加载模型
+        with _model_lock:
+            if not model:
+                # faster_whisper 导入较重，推迟到首次需要加载模型时
+                from faster_whisper import WhisperModel
+
+                model_path = f"{utils.root_dir()}/app/models/faster-whisper-large-v2"
+                model_bin_file = f"{model_path}/model.bin"
+                if not os.path.isdir(model_path) or not os.path.isfile(model_bin_file):
+                    logger.error(
+                        "请先下载 whisper 模型\n\n"
+                        "********************************************\n"
+                        "下载地址：https://huggingface.co/guillaumekln/faster-whisper-large-v2\n"
+                        "存放路径：app/models \n"
+                        "********************************************\n"
+                    )
+                    return None
 
-        # 尝试使用 CUDA，如果失败则回退到 CPU
-        try:
-            import torch
-            if torch.cuda.is_available():
+                # 尝试使用 CUDA，如果失败则回退到 CPU
                 try:
-                    logger.info(f"尝试使用 CUDA 加载模型: {model_path}")
+                    import torch
+                    if torch.cuda.is_available():
+                        try:
+                            logger.info(f"尝试使用 CUDA 加载模型: {model_path}")
+                            model = WhisperModel(
+                                model_size_or_path=model_path,
+                                device="cuda",
+                                compute_type="float16",
+                                local_files_only=True
+                            )
+                            device = "cuda"
+                            compute_type = "float16"
+                            logger.info("成功使用 CUDA 加载模型")
+                        except Exception as e:
+                            logger.warning(f"CUDA 加载失败，错误信息: {str(e)}")
+                            logger.warning("回退到 CPU 模式")
+                            device = "cpu"
+                            compute_type = "int8"
+                    else:
+                        logger.info("未检测到 CUDA，使用 CPU 模式")
+                        device = "cpu"
+                        compute_type = "int8"
+                except ImportError:
+                    logger.warning("未安装 torch，使用 CPU 模式")
+                    device = "cpu"
+                    compute_type = "int8"
+
+                if device == "cpu":
+                    logger.info(f"使用 CPU 加载模型: {model_path}")
                     model = WhisperModel(
                         model_size_or_path=model_path,
-                        device="cuda",
-                        compute_type="float16",
+                        device=device,
+                        compute_type=compute_type,
                         local_files_only=True
                     )
-                    device = "cuda"
-                    compute_type = "float16"
-                    logger.info("成功使用 CUDA 加载模型")
-                except Exception as e:
-                    logger.warning(f"CUDA 加载失败，错误信息: {str(e)}")
-                    logger.warning("回退到 CPU 模式")
-                    device = "cpu"
-                    compute_type = "int8"
-            else:
-                logger.info("未检测到 CUDA，使用 CPU 模式")
-                device = "cpu"
-                compute_type = "int8"
-        except ImportError:
-            logger.warning("未安装 torch，使用 CPU 模式")
-            device = "cpu"
-            compute_type = "int8"
-
-        if device == "cpu":
-            logger.info(f"使用 CPU 加载模型: {model_path}")
-            model = WhisperModel(
-                model_size_or_path=model_path,
-                device=device,
-                compute_type=compute_type,
-                local_files_only=True
-            )
 
-        logger.info(f"模型加载完成，使用设备: {device}, 计算类型: {compute_type}")
+                logger.info(f"模型加载完成，使用设备: {device}, 计算类型: {compute_type}")
 
     logger.info(f"start, output file: {subtitle_file}")
     if not subtitle_file:
@@ -1,81 +1,96 @@
 import json
-from typing import Dict, Any
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
 
-def check_format(script_content: str) -> Dict[str, Any]:
+# 脚本大小上限，超出后直接拒绝，避免解析和遍历超大输入
+MAX_SCRIPT_BYTES = 32 * 1024 * 1024
+MAX_CLIPS = 10000
+
+# 必需字段及其校验顺序
+REQUIRED_FIELDS = ('narration', 'picture', 'timestamp')
+_get_fields = itemgetter(*REQUIRED_FIELDS)
+
+# 与输入无关的检查结果只读共享，不在每次调用时重新构建
+_RESULT_OK = MappingProxyType({
+    'success': True,
+    'message': '脚本格式检查通过'
+})
+_ERR_NOT_ARRAY = MappingProxyType({
+    'success': False,
+    'message': '脚本必须是JSON数组格式'
+})
+
+
+def _error(message: str) -> Dict[str, Any]:
+    """构建需要填充参数的错误结果"""
+    return {
+        'success': False,
+        'message': message
+    }
+
+
+def _clip_error(i: int, clip: Any) -> Optional[str]:
+    """按字段缺失、类型、内容的顺序检查单个片段，返回错误信息，通过时返回None"""
+    for field in REQUIRED_FIELDS:
+        if not isinstance(clip, dict) or field not in clip:
+            return '第%d个片段缺少必需字段: %s' % (i + 1, field)
+
+    for field in REQUIRED_FIELDS:
+        if not isinstance(clip[field], str):
+            return '第%d个片段的%s必须是字符串' % (i + 1, field)
+
+    for field in REQUIRED_FIELDS:
+        if not clip[field].strip():
+            return '第%d个片段的%s不能为空' % (i + 1, field)
+
+    return None
+
+
+def check_format(script_content: str) -> Mapping[str, Any]:
     """检查脚本格式
     Args:
         script_content: 脚本内容
     Returns:
-        Dict: {'success': bool, 'message': str}
+        Mapping: {'success': bool, 'message': str}，固定结果为只读映射，需要修改或序列化时先转换为 dict
     """
     try:
+        # 按 UTF-8 字节数限制大小；字符数已超限时无需再编码
+        if (len(script_content) > MAX_SCRIPT_BYTES
+                or len(script_content.encode('utf-8', 'surrogatepass')) > MAX_SCRIPT_BYTES):
+            return _error('脚本过大，不能超过 %dMB' % (MAX_SCRIPT_BYTES // (1024 * 1024)))
+
         # 检查是否为有效的JSON
         data = json.loads(script_content)
-        
+
         # 检查是否为列表
         if not isinstance(data, list):
-            return {
-                'success': False,
-                'message': '脚本必须是JSON数组格式'
-            }
-        
-        # 检查每个片段
+            return _ERR_NOT_ARRAY
+
+        if len(data) > MAX_CLIPS:
+            return _error('脚本片段过多，不能超过 %d 个' % MAX_CLIPS)
+
+        # 快速路径：一次性取出每个片段的必需字段，按列检查类型和内容
+        try:
+            rows = [_get_fields(clip) for clip in data]
+        except (KeyError, TypeError):
+            rows = None
+
+        if rows is not None:
+            columns = list(zip(*rows))
+            if (all(isinstance(value, str) for values in columns for value in values)
+                    and all(all(map(str.strip, values)) for values in columns)):
+                return _RESULT_OK
+
+        # 存在问题时逐个片段检查，定位第一个出错的片段
         for i, clip in enumerate(data):
-            # 检查必需字段
-            required_fields = ['narration', 'picture', 'timestamp']
-            for field in required_fields:
-                if field not in clip:
-                    return {
-                        'success': False,
-                        'message': f'第{i+1}个片段缺少必需字段: {field}'
-                    }
-            
-            # 检查字段类型
-            if not isinstance(clip['narration'], str):
-                return {
-                    'success': False,
-                    'message': f'第{i+1}个片段的narration必须是字符串'
-                }
-            if not isinstance(clip['picture'], str):
-                return {
-                    'success': False,
-                    'message': f'第{i+1}个片段的picture必须是字符串'
-                }
-            if not isinstance(clip['timestamp'], str):
-                return {
-                    'success': False,
-                    'message': f'第{i+1}个片段的timestamp必须是字符串'
-                }
-            
-            # 检查字段内容不能为空
-            if not clip['narration'].strip():
-                return {
-                    'success': False,
-                    'message': f'第{i+1}个片段的narration不能为空'
-                }
-            if not clip['picture'].strip():
-                return {
-                    'success': False,
-                    'message': f'第{i+1}个片段的picture不能为空'
-                }
-            if not clip['timestamp'].strip():
-                return {
-                    'success': False,
-                    'message': f'第{i+1}个片段的timestamp不能为空'
-                }
-
-        return {
-            'success': True,
-            'message': '脚本格式检查通过'
-        }
+            message = _clip_error(i, clip)
+            if message:
+                return _error(message)
+
+        return _RESULT_OK
 
     except json.JSONDecodeError as e:
-        return {
-            'success': False,
-            'message': f'JSON格式错误: {str(e)}'
-        }
+        return _error('JSON格式错误: %s' % e)
     except Exception as e:
-        return {
-            'success': False,
-            'message': f'检查过程中发生错误: {str(e)}'
-        }
+        return _error('检查过程中发生错误: %s' % e)
@@ -1,28 +1,55 @@
-import json
+import re
 from typing import List, Union, Dict
 import os
 from pathlib import Path
 from loguru import logger
-from tqdm import tqdm
 import asyncio
 from tenacity import retry, stop_after_attempt, RetryError, retry_if_exception_type, wait_exponential
 from google.api_core import exceptions
 import google.generativeai as genai
 import PIL.Image
+import PIL.ImageFile
+import io
 import traceback
 from app.utils import utils
 
+# 关键帧文件名末尾的时间戳，如 keyframe_001253_000050100 中的 000050100 (HHMMSSmmm)，旧格式不含毫秒
+_TIMESTAMP_RE = re.compile(r'_(\d{2})(\d{2})(\d{2})(\d{3})?$')
+
+
+def _format_timestamp(img_path: str) -> str:
+    """从关键帧文件名中提取时间戳，转换为 HH:MM:SS,mmm 格式"""
+    stem = Path(img_path).stem
+    match = _TIMESTAMP_RE.search(stem)
+    if not match:
+        logger.error(f"时间戳格式转换错误: {stem}")
+        return stem.split('_')[-1]
+
+    hours, minutes, seconds, milliseconds = match.groups('000')
+    return f"{hours}:{minutes}:{seconds},{milliseconds}"
+
 
 class VisionAnalyzer:
     """视觉分析器类"""
 
-    def __init__(self, model_name: str = "gemini-1.5-flash", api_key: str = None):
-        """初始化视觉分析器"""
+    def __init__(self, model_name: str = "gemini-1.5-flash", api_key: str = None, concurrency: int = 3,
+                 max_edge: int = 1024):
+        """初始化视觉分析器
+
+        Args:
+            model_name: 模型名称
+            api_key: API密钥
+            concurrency: 同时处理的批次数量，每分钟请求数受限的账号（如免费额度）可调低至1，
+                对应配置项 [frames] vision_concurrency
+            max_edge: 图片最长边上限，超出时等比缩小
+        """
         if not api_key:
             raise ValueError("必须提供API密钥")
 
         self.model_name = model_name
         self.api_key = api_key
+        self.concurrency = max(1, concurrency)
+        self.max_edge = max_edge
 
         # 初始化配置
         self._configure_client()
@@ -53,88 +80,103 @@ class VisionAnalyzer:
             print(f"API配额限制: {str(e)}")
             raise RetryError("API调用失败")
 
+    def _image_part(self, image: PIL.Image.Image, buffered: io.BytesIO):
+        """将图片转换为请求内容
+
+        未经修改的本地图片由 SDK 直接读取原文件；缩放或转换过的图片编码为 JPEG，
+        避免 SDK 将其编码为体积更大的无损 WebP。JPEG 无法保存的模式（如 RGBA、P）仍交给 SDK 处理
+        """
+        if isinstance(image, PIL.ImageFile.ImageFile) and image.filename:
+            return image
+        if image.mode not in ('RGB', 'L'):
+            return image
+        buffered.seek(0)
+        buffered.truncate()
+        image.save(buffered, format="JPEG", quality=85)
+        return {'mime_type': 'image/jpeg', 'data': buffered.getvalue()}
+
+    def _build_image_parts(self, batch: List[PIL.Image.Image]) -> list:
+        """转换一个批次的图片，结果在重试之间复用；同一批次复用一个编码缓冲区"""
+        buffered = io.BytesIO()
+        return [self._image_part(img, buffered) for img in batch]
+
     async def analyze_images(self,
                            images: Union[List[str], List[PIL.Image.Image]],
                            prompt: str,
                            batch_size: int) -> List[Dict]:
         """批量分析多张图片"""
         try:
-            # 加载图片
-            if isinstance(images[0], str):
-                logger.info("正在加载图片...")
-                images = self.load_images(images)
-
             # 验证图片列表
             if not images:
                 raise ValueError("图片列表为空")
 
-            # 验证每个图片对象
-            valid_images = []
-            for i, img in enumerate(images):
-                if not isinstance(img, PIL.Image.Image):
-                    logger.error(f"无效的图片对象，索引 {i}: {type(img)}")
-                    continue
-                valid_images.append(img)
+            # 图片路径在各批次处理前再加载，加载与其他批次的请求重叠进行，也不必同时保留全部图片
+            load_from_paths = isinstance(images[0], str)
+            if not load_from_paths:
+                # 验证每个图片对象
+                valid_images = []
+                for i, img in enumerate(images):
+                    if not isinstance(img, PIL.Image.Image):
+                        logger.error(f"无效的图片对象，索引 {i}: {type(img)}")
+                        continue
+                    valid_images.append(img)
+
+                if not valid_images:
+                    raise ValueError("没有有效的图片对象")
 
-            if not valid_images:
-                raise ValueError("没有有效的图片对象")
+                images = valid_images
 
-            images = valid_images
-            results = []
             total_batches = (len(images) + batch_size - 1) // batch_size
 
-            logger.debug(f"共 {total_batches} 个批次，每批次 {batch_size} 张图片")
-
-            with tqdm(total=total_batches, desc="分析进度") as pbar:
-                for i in range(0, len(images), batch_size):
-                    batch = images[i:i + batch_size]
-                    retry_count = 0
-
-                    while retry_count < 3:
-                        try:
-                            # 在每个批次处理前添加小延迟
-                            if i > 0:
-                                await asyncio.sleep(2)
-
-                            # 确保每个批次的图片都是有效的
-                            valid_batch = [img for img in batch if isinstance(img, PIL.Image.Image)]
-                            if not valid_batch:
-                                raise ValueError(f"批次 {i // batch_size} 中没有有效的图片")
-
-                            response = await self._generate_content_with_retry(prompt, valid_batch)
-                            results.append({
-                                'batch_index': i // batch_size,
-                                'images_processed': len(valid_batch),
-                                'response': response.text,
-                                'model_used': self.model_name
-                            })
-                            break
-
-                        except Exception as e:
-                            retry_count += 1
-                            error_msg = f"批次 {i // batch_size} 处理出错: {str(e)}"
-                            logger.error(error_msg)
-
-                            if retry_count >= 3:
-                                results.append({
-                                    'batch_index': i // batch_size,
-                                    'images_processed': len(batch),
-                                    'error': error_msg,
-                                    'model_used': self.model_name
-                                })
-                            else:
-                                logger.info(f"批次 {i // batch_size} 处理失败，等待60秒后重试当前批次...")
-                                await asyncio.sleep(60)
-
-                    pbar.update(1)
-
-            return results
+            logger.debug(f"共 {total_batches} 个批次，每批次 {batch_size} 张图片，并发数 {self.concurrency}")
+
+            return await utils.analyze_image_batches(
+                images, batch_size, self.concurrency,
+                lambda batch_index, batch, batch_paths: self._analyze_batch(prompt, batch_index, batch),
+                max_edge=self.max_edge
+            )
 
         except Exception as e:
             error_msg = f"图片分析过程中发生错误: {str(e)}\n{traceback.format_exc()}"
             logger.error(error_msg)
             raise Exception(error_msg)
 
+    async def _analyze_batch(self, prompt: str, batch_index: int, batch: List[PIL.Image.Image]) -> Dict:
+        """分析单个批次，失败时重试当前批次"""
+        # 确保每个批次的图片都是有效的
+        valid_batch = [img for img in batch if isinstance(img, PIL.Image.Image)]
+        parts = None
+
+        try:
+            if not valid_batch:
+                raise ValueError(f"批次 {batch_index} 中没有有效的图片")
+
+            async for attempt in utils.batch_retrying(batch_index):
+                with attempt:
+                    # 每个批次只转换一次，重试时直接复用
+                    if parts is None:
+                        parts = await asyncio.to_thread(self._build_image_parts, valid_batch)
+
+                    response = await self._generate_content_with_retry(prompt, parts)
+                    response_text = response.text
+
+        except Exception as e:
+            error_msg = f"批次 {batch_index} 处理出错: {str(e)}"
+            logger.error(error_msg)
+            return {
+                'batch_index': batch_index,
+                'images_processed': len(batch),
+                'error': error_msg,
+                'model_used': self.model_name
+            }
+
+        return {
+            'batch_index': batch_index,
+            'images_processed': len(valid_batch),
+            'response': response_text,
+            'model_used': self.model_name
+        }
+
     def save_results_to_txt(self, results: List[Dict], output_dir: str):
         """将分析结果保存到txt文件"""
         # 确保输出目录存在
@@ -148,26 +190,8 @@ class VisionAnalyzer:
             image_paths = result['image_paths']
 
             # 从文件名中提取时间戳并转换为标准格式
-            def format_timestamp(img_path):
-                # 从文件名中提取时间部分
-                timestamp = Path(img_path).stem.split('_')[-1]
-                try:
-                    # 将时间转换为秒
-                    seconds = utils.time_to_seconds(timestamp.replace('_', ':'))
-                    # 转换为 HH:MM:SS,mmm 格式
-                    hours = int(seconds // 3600)
-                    minutes = int((seconds % 3600) // 60)
-                    seconds_remainder = seconds % 60
-                    whole_seconds = int(seconds_remainder)
-                    milliseconds = int((seconds_remainder - whole_seconds) * 1000)
-                    
-                    return f"{hours:02d}:{minutes:02d}:{whole_seconds:02d},{milliseconds:03d}"
-                except Exception as e:
-                    logger.error(f"时间戳格式转换错误: {timestamp}, {str(e)}")
-                    return timestamp
-
-            start_timestamp = format_timestamp(image_paths[0])
-            end_timestamp = format_timestamp(image_paths[-1])
+            start_timestamp = _format_timestamp(image_paths[0])
+            end_timestamp = _format_timestamp(image_paths[-1])
             
             txt_path = os.path.join(output_dir, f"frame_{start_timestamp}_{end_timestamp}.txt")
 
@@ -175,41 +199,3 @@ class VisionAnalyzer:
             with open(txt_path, 'w', encoding='utf-8') as f:
                 f.write(response_text.strip())
             logger.info(f"已保存分析结果到: {txt_path}")
-
-    def load_images(self, image_paths: List[str]) -> List[PIL.Image.Image]:
-        """
-        加载多张图片
-        Args:
-            image_paths: 图片路径列表
-        Returns:
-            加载后的PIL Image对象列表
-        """
-        images = []
-        failed_images = []
-
-        for img_path in image_paths:
-            try:
-                if not os.path.exists(img_path):
-                    logger.error(f"图片文件不存在: {img_path}")
-                    failed_images.append(img_path)
-                    continue
-
-                img = PIL.Image.open(img_path)
-                # 确保图片被完全加载
-                img.load()
-                # 转换为RGB模式
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                images.append(img)
-
-            except Exception as e:
-                logger.error(f"无法加载图片 {img_path}: {str(e)}")
-                failed_images.append(img_path)
-
-        if failed_images:
-            logger.warning(f"以下图片加载失败:\n{json.dumps(failed_images, indent=2, ensure_ascii=False)}")
-
-        if not images:
-            raise ValueError("没有成功加载任何图片")
-
-        return images
\ No newline at end of file
@@ -1,22 +1,22 @@
-import json
 from typing import List, Union, Dict
 import os
 from pathlib import Path
 from loguru import logger
-from tqdm import tqdm
 import asyncio
 from tenacity import retry, stop_after_attempt, RetryError, wait_exponential
-from openai import OpenAI
+from openai import AsyncOpenAI
 import PIL.Image
 import base64
 import io
 import traceback
+from app.utils import utils
 
 
 class QwenAnalyzer:
     """千问视觉分析器类"""
 
-    def __init__(self, model_name: str = "qwen-vl-max-latest", api_key: str = None, base_url: str = None):
+    def __init__(self, model_name: str = "qwen-vl-max-latest", api_key: str = None, base_url: str = None,
+                 max_edge: int = 1024, concurrency: int = 3):
         """
         初始化千问视觉分析器
         
@@ -24,6 +24,8 @@ class QwenAnalyzer:
             model_name: 模型名称，默认使用 qwen-vl-max-latest
             api_key: 阿里云API密钥
             base_url: API基础URL，如果为None则使用默认值
+            max_edge: 图片最长边上限，超出时等比缩小
+            concurrency: 同时处理的批次数量，对应配置项 [frames] vision_concurrency
         """
         if not api_key:
             raise ValueError("必须提供API密钥")
@@ -31,6 +33,8 @@ class QwenAnalyzer:
         self.model_name = model_name
         self.api_key = api_key
         self.base_url = base_url or "https://dashscope.aliyuncs.com/compatible-mode/v1"
+        self.max_edge = max_edge
+        self.concurrency = max(1, concurrency)
 
         # 配置API客户端
         self._configure_client()
@@ -41,7 +45,8 @@ class QwenAnalyzer:
         使用最简化的参数配置，避免不必要的参数
         """
         try:
-            self.client = OpenAI(
+            # 使用异步客户端，直接在事件循环中等待请求并复用连接
+            self.client = AsyncOpenAI(
                 api_key=self.api_key,
                 base_url=self.base_url
             )
@@ -49,33 +54,45 @@ class QwenAnalyzer:
             logger.error(f"初始化OpenAI客户端失败: {str(e)}")
             raise
 
-    def _image_to_base64(self, image: PIL.Image.Image) -> str:
+    def _image_to_base64(self, image: PIL.Image.Image, buffered: io.BytesIO = None) -> str:
         """
         将PIL图片对象转换为base64字符串
+        可传入缓冲区在批量编码时复用
+        """
+        if buffered is None:
+            buffered = io.BytesIO()
+        else:
+            buffered.seek(0)
+            buffered.truncate()
+        # 优化哈夫曼表，在画质不变的前提下减小体积
+        image.save(buffered, format="JPEG", quality=75, optimize=True)
+        with buffered.getbuffer() as view:
+            return base64.b64encode(view).decode("utf-8")
+
+    def _build_image_content(self, batch: List[PIL.Image.Image]) -> List[Dict]:
+        """
+        将一个批次的图片编码为消息内容，结果在重试之间复用
         """
         buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        return base64.b64encode(buffered.getvalue()).decode("utf-8")
+        return [
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{self._image_to_base64(img, buffered)}"
+                }
+            }
+            for img in batch
+        ]
 
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10)
     )
-    async def _generate_content_with_retry(self, prompt: str, batch: List[PIL.Image.Image]):
+    async def _generate_content_with_retry(self, prompt: str, image_content: List[Dict]):
         """使用重试机制的内部方法来调用千问API"""
         try:
-            # 构建消息内容
-            content = []
-
-            # 添加图片
-            for img in batch:
-                base64_image = self._image_to_base64(img)
-                content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}"
-                    }
-                })
+            # 构建消息内容，图片部分已预先编码
+            content = list(image_content)
 
             # 添加文本提示
             content.append({
@@ -84,8 +101,7 @@ class QwenAnalyzer:
             })
 
             # 调用API
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
+            response = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=[{
                     "role": "user",
@@ -113,94 +129,85 @@ class QwenAnalyzer:
             分析结果列表
         """
         try:
-            # 保存原始图片路径（如果是路径列表的话）
-            original_paths = images if isinstance(images[0], str) else None
-
-            # 加载图片
-            if isinstance(images[0], str):
-                logger.info("正在加载图片...")
-                images = self.load_images(images)
-
             # 验证图片列表
             if not images:
                 raise ValueError("图片列表为空")
 
-            # 验证每个图片对象
-            valid_images = []
-            valid_paths = []
-            for i, img in enumerate(images):
-                if not isinstance(img, PIL.Image.Image):
-                    logger.error(f"无效的图片对象，索引 {i}: {type(img)}")
-                    continue
-                valid_images.append(img)
-                if original_paths:
-                    valid_paths.append(original_paths[i])
-
-            if not valid_images:
-                raise ValueError("没有有效的图片对象")
-
-            images = valid_images
-            results = []
-            total_batches = (len(images) + batch_size - 1) // batch_size
-
-            with tqdm(total=total_batches, desc="分析进度") as pbar:
-                for i in range(0, len(images), batch_size):
-                    batch = images[i:i + batch_size]
-                    batch_paths = valid_paths[i:i + batch_size] if valid_paths else None
-                    retry_count = 0
-
-                    while retry_count < 3:
-                        try:
-                            # 在每个批次处理前��加小延迟
-                            if i > 0:
-                                await asyncio.sleep(2)
-
-                            # 确保每个批次的图片都是有效的
-                            valid_batch = [img for img in batch if isinstance(img, PIL.Image.Image)]
-                            if not valid_batch:
-                                raise ValueError(f"批次 {i // batch_size} 中没有有效的图片")
-
-                            response = await self._generate_content_with_retry(prompt, valid_batch)
-                            result_dict = {
-                                'batch_index': i // batch_size,
-                                'images_processed': len(valid_batch),
-                                'response': response,
-                                'model_used': self.model_name
-                            }
-
-                            # 添加图片路径信息（如果有的话）
-                            if batch_paths:
-                                result_dict['image_paths'] = batch_paths
-
-                            results.append(result_dict)
-                            break
-
-                        except Exception as e:
-                            retry_count += 1
-                            error_msg = f"批次 {i // batch_size} 处理出错: {str(e)}"
-                            logger.error(error_msg)
-
-                            if retry_count >= 3:
-                                results.append({
-                                    'batch_index': i // batch_size,
-                                    'images_processed': len(batch),
-                                    'error': error_msg,
-                                    'model_used': self.model_name,
-                                    'image_paths': batch_paths if batch_paths else []
-                                })
-                            else:
-                                logger.info(f"批次 {i // batch_size} 处理失败，等待60秒后重试当前批次...")
-                                await asyncio.sleep(60)
-
-                    pbar.update(1)
-
-            return results
+            # 图片路径在各批次处理前再加载，加载与其他批次的请求重叠进行，也不必同时保留全部图片
+            load_from_paths = isinstance(images[0], str)
+            if not load_from_paths:
+                # 验证每个图片对象
+                valid_images = []
+                for i, img in enumerate(images):
+                    if not isinstance(img, PIL.Image.Image):
+                        logger.error(f"无效的图片对象，索引 {i}: {type(img)}")
+                        continue
+                    valid_images.append(img)
+
+                if not valid_images:
+                    raise ValueError("没有有效的图片对象")
+
+                images = valid_images
+
+            return await utils.analyze_image_batches(
+                images, batch_size, self.concurrency,
+                lambda batch_index, batch, batch_paths: self._analyze_batch(prompt, batch_index, batch, batch_paths),
+                max_edge=self.max_edge
+            )
 
         except Exception as e:
             error_msg = f"图片分析过程中发生错误: {str(e)}\n{traceback.format_exc()}"
             logger.error(error_msg)
             raise Exception(error_msg)
 
+    async def _analyze_batch(self,
+                             prompt: str,
+                             batch_index: int,
+                             batch: List[PIL.Image.Image],
+                             batch_paths: List[str] = None) -> Dict:
+        """
+        分析单个批次，失败时重试当前批次
+        """
+        # 确保每个批次的图片都是有效的
+        valid_batch = [img for img in batch if isinstance(img, PIL.Image.Image)]
+        image_content = None
+
+        try:
+            if not valid_batch:
+                raise ValueError(f"批次 {batch_index} 中没有有效的图片")
+
+            async for attempt in utils.batch_retrying(batch_index):
+                with attempt:
+                    # 每个批次只编码一次，重试时直接复用；编码在线程中执行，避免阻塞事件循环
+                    if image_content is None:
+                        image_content = await asyncio.to_thread(self._build_image_content, valid_batch)
+
+                    response = await self._generate_content_with_retry(prompt, image_content)
+
+        except Exception as e:
+            error_msg = f"批次 {batch_index} 处理出错: {str(e)}"
+            logger.error(error_msg)
+            return {
+                'batch_index': batch_index,
+                'images_processed': len(batch),
+                'error': error_msg,
+                'model_used': self.model_name,
+                'image_paths': batch_paths if batch_paths else []
+            }
+
+        result_dict = {
+            'batch_index': batch_index,
+            'images_processed': len(valid_batch),
+            'response': response,
+            'model_used': self.model_name
+        }
+
+        # 添加图片路径信息（如果有的话）
+        if batch_paths:
+            result_dict['image_paths'] = batch_paths
+
+        return result_dict
+
     def save_results_to_txt(self, results: List[Dict], output_dir: str):
         """将分析结果保存到txt文件"""
         # 确保输出目录存在
@@ -225,41 +232,3 @@ class QwenAnalyzer:
             with open(txt_path, 'w', encoding='utf-8') as f:
                 f.write(response_text.strip())
             logger.info(f"已保存分析结果到: {txt_path}")
-
-    def load_images(self, image_paths: List[str]) -> List[PIL.Image.Image]:
-        """
-        加载多张图片
-        Args:
-            image_paths: 图片路径列表
-        Returns:
-            加载后的PIL Image对象列表
-        """
-        images = []
-        failed_images = []
-
-        for img_path in image_paths:
-            try:
-                if not os.path.exists(img_path):
-                    logger.error(f"图片文件不存在: {img_path}")
-                    failed_images.append(img_path)
-                    continue
-
-                img = PIL.Image.open(img_path)
-                # 确保图片被完全加载
-                img.load()
-                # 转换为RGB模式
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                images.append(img)
-
-            except Exception as e:
-                logger.error(f"无法加载图片 {img_path}: {str(e)}")
-                failed_images.append(img_path)
-
-        if failed_images:
-            logger.warning(f"以下图片加载失败:\n{json.dumps(failed_images, indent=2, ensure_ascii=False)}")
-
-        if not images:
-            raise ValueError("没有成功加载任何图片")
-
-        return images
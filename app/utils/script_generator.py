@@ -1,14 +1,19 @@
 import os
 import json
+import hashlib
 import traceback
 from loguru import logger
 import tiktoken
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from datetime import datetime
 from openai import OpenAI
 import google.generativeai as genai
 import time
 
+# 已生成文案的缓存，相同模型、提示词和参数的请求直接返回上次结果，超出上限时淘汰最早的条目
+SCRIPT_CACHE_SIZE = 1024
+_script_cache: Dict[str, str] = {}
+
 
 class BaseGenerator:
     def __init__(self, model_name: str, api_key: str, prompt: str):
@@ -26,14 +31,36 @@ class BaseGenerator:
             "presence_penalty": 0.5
         }
 
+    def _cache_key(self, messages: list, params: dict) -> str:
+        """根据生成器、接口地址、模型、消息和参数计算缓存键"""
+        # 兼容 OpenAI 接口的不同服务可能使用相同的模型名称，按接口地址区分
+        base_url = getattr(getattr(self, "client", None), "base_url", None)
+        payload = json.dumps(
+            [type(self).__name__, base_url, self.model_name, messages, params],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
     def _try_generate(self, messages: list, params: dict = None) -> str:
         max_attempts = 3
         tolerance = 5
+        params = params or self.default_params
+
+        cache_key = self._cache_key(messages, params)
+        cached = _script_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("命中文案缓存，跳过本次请求")
+            return cached
         
         for attempt in range(max_attempts):
             try:
-                response = self._generate(messages, params or self.default_params)
-                return self._process_response(response)
+                response = self._generate(messages, params)
+                result = self._process_response(response)
+                if result:
+                    if len(_script_cache) >= SCRIPT_CACHE_SIZE:
+                        _script_cache.pop(next(iter(_script_cache)), None)
+                    _script_cache[cache_key] = result
+                return result
             except Exception as e:
                 if attempt == max_attempts - 1:
                     raise
@@ -66,18 +93,94 @@ class BaseGenerator:
 
         try:
             generated_script = self._try_generate(messages, self.default_params)
-            
-            # 更新上下文
-            if generated_script:
-                self.last_chunk_ending = generated_script[-self.chunk_overlap:] if len(
-                    generated_script) > self.chunk_overlap else generated_script
-                
+            self._update_context(generated_script)
             return generated_script
             
         except Exception as e:
             logger.error(f"Script generation failed: {str(e)}")
             raise
 
+    def generate_scripts_batch(self, scenes: List[Tuple[str, int]]) -> List[str]:
+        """
+        一次请求为多段连续画面生成文案
+
+        Args:
+            scenes: 按时间顺序排列的 (画面描述, 字数) 列表
+
+        Returns:
+            List[str]: 与 scenes 顺序一致的文案；结果无法解析时改为逐段生成
+        """
+        if len(scenes) == 1:
+            return [self.generate_script(*scenes[0])]
+
+        segments = "\n\n".join(
+            f"### 片段 {i}\n字数要求：{word_count}字，允许误差±5字\n画面描述：{scene_description}"
+            for i, (scene_description, word_count) in enumerate(scenes)
+        )
+        prompt = f"""{self.base_prompt}
+
+上一段文案的结尾：{self.last_chunk_ending if self.last_chunk_ending else "这是第一段，无需考虑上文"}
+
+以下是按时间顺序排列的 {len(scenes)} 段画面描述：
+
+{segments}
+
+请为每个片段分别创作文案，确保与上文以及片段之间自然衔接，保持叙事的连贯性和趣味性。
+严格遵守每个片段的字数要求；
+只输出JSON数组，不要出现其他任何内容，格式为：[{{"i": 0, "script": "文案"}}, {{"i": 1, "script": "文案"}}]"""
+
+        messages = [
+            {"role": "system", "content": self.base_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+        # 多段文案共用一次请求，按片段数放宽输出长度上限
+        params = dict(self.default_params)
+        if params.get("max_tokens"):
+            params["max_tokens"] *= len(scenes)
+
+        # 只有结果无法解析时才改为逐段生成，接口错误直接抛出
+        output = self._try_generate(messages, params)
+        try:
+            scripts = self._parse_batch_scripts(output, len(scenes))
+        except (ValueError, KeyError, TypeError) as e:
+            # 无法解析的结果不保留在缓存中，下次仍会重新请求
+            _script_cache.pop(self._cache_key(messages, params), None)
+            logger.warning(f"批量生成文案失败，改为逐段生成: {str(e)}")
+            return [self.generate_script(*scene) for scene in scenes]
+
+        self._update_context(scripts[-1])
+        return scripts
+
+    @staticmethod
+    def _parse_batch_scripts(output: str, count: int) -> List[str]:
+        """解析批量生成的JSON数组，按片段序号返回文案"""
+        output = output.strip()
+        # 去掉模型可能附带的代码块标记
+        if output.startswith("```"):
+            output = output.strip("`")
+            output = output[output.find("["):]
+
+        items = json.loads(output)
+        indices, scripts = [], {}
+        for item in items:
+            if not isinstance(item["script"], str):
+                raise TypeError(f"片段 {item['i']} 的文案不是字符串")
+            # 模型可能以字符串形式给出序号
+            indices.append(int(item["i"]))
+            scripts[indices[-1]] = item["script"].strip()
+        if sorted(indices) != list(range(count)):
+            raise ValueError(f"批量文案序号不匹配，期望 0-{count - 1}，实际 {sorted(indices)}")
+        if not all(scripts.values()):
+            raise ValueError("批量文案中存在空文案")
+        return [scripts[i] for i in range(count)]
+
+    def _update_context(self, generated_script: str):
+        """记录文案结尾，用于衔接下一段"""
+        if generated_script:
+            self.last_chunk_ending = generated_script[-self.chunk_overlap:] if len(
+                generated_script) > self.chunk_overlap else generated_script
+
 
 class OpenAIGenerator(BaseGenerator):
     """OpenAI API 生成器实现"""
@@ -434,14 +537,30 @@ class ScriptProcessor:
             logger.warning(f"字数计算错误: {traceback.format_exc()}")
             return 100  # 发生错误时返回默认字数
 
-    def process_frames(self, frame_content_list: List[Dict]) -> List[Dict]:
-        for frame_content in frame_content_list:
-            word_count = self.calculate_duration_and_word_count(frame_content["timestamp"])
-            script = self.generator.generate_script(frame_content["picture"], word_count)
-            frame_content["narration"] = script
-            frame_content["OST"] = 2
-            logger.info(f"时间范围: {frame_content['timestamp']}, 建议字数: {word_count}")
-            logger.info(script)
+    def process_frames(self, frame_content_list: List[Dict], batch_size: int = 4) -> List[Dict]:
+        """
+        为每段画面生成解说文案
+
+        Args:
+            frame_content_list: 画面列表，包含 timestamp 和 picture
+            batch_size: 每次请求合并生成的画面数量，为1时逐段生成
+
+        Returns:
+            List[Dict]: 添加了 narration 的画面列表
+        """
+        batch_size = max(1, batch_size)
+        for start in range(0, len(frame_content_list), batch_size):
+            frames = frame_content_list[start:start + batch_size]
+            word_counts = [self.calculate_duration_and_word_count(frame["timestamp"]) for frame in frames]
+            scripts = self.generator.generate_scripts_batch(
+                [(frame["picture"], word_count) for frame, word_count in zip(frames, word_counts)]
+            )
+
+            for frame_content, word_count, script in zip(frames, word_counts, scripts):
+                frame_content["narration"] = script
+                frame_content["OST"] = 2
+                logger.info(f"时间范围: {frame_content['timestamp']}, 建议字数: {word_count}")
+                logger.info(script)
 
         self._save_results(frame_content_list)
         return frame_content_list
@@ -459,6 +578,31 @@ class ScriptProcessor:
                 
                 return f"{hours:02d}:{minutes:02d}:{whole_seconds:02d},{milliseconds:03d}"
 
+            def time_to_seconds(time_str: str) -> float:
+                """将时间字符串转换为秒数（包含毫秒）"""
+                try:
+                    if ',' in time_str:
+                        time_part, ms_part = time_str.split(',')
+                        ms = float(ms_part) / 1000
+                    else:
+                        time_part = time_str
+                        ms = 0
+
+                    parts = time_part.split(':')
+                    if len(parts) == 3:  # HH:MM:SS
+                        h, m, s = map(float, parts)
+                        seconds = h * 3600 + m * 60 + s
+                    elif len(parts) == 2:  # MM:SS
+                        m, s = map(float, parts)
+                        seconds = m * 60 + s
+                    else:  # SS
+                        seconds = float(parts[0])
+
+                    return seconds + ms
+                except Exception as e:
+                    logger.error(f"时间格式转换错误 {time_str}: {str(e)}")
+                    return 0.0
+
             # 计算新的时间戳
             current_time = 0.0  # 当前时间点（秒，包含毫秒）
 
@@ -466,31 +610,6 @@ class ScriptProcessor:
                 # 获取原始时间戳的持续时间
                 start_str, end_str = frame['timestamp'].split('-')
 
-                def time_to_seconds(time_str: str) -> float:
-                    """将时间字符串转换为秒数（包含毫秒）"""
-                    try:
-                        if ',' in time_str:
-                            time_part, ms_part = time_str.split(',')
-                            ms = float(ms_part) / 1000
-                        else:
-                            time_part = time_str
-                            ms = 0
-
-                        parts = time_part.split(':')
-                        if len(parts) == 3:  # HH:MM:SS
-                            h, m, s = map(float, parts)
-                            seconds = h * 3600 + m * 60 + s
-                        elif len(parts) == 2:  # MM:SS
-                            m, s = map(float, parts)
-                            seconds = m * 60 + s
-                        else:  # SS
-                            seconds = float(parts[0])
-
-                        return seconds + ms
-                    except Exception as e:
-                        logger.error(f"时间格式转换错误 {time_str}: {str(e)}")
-                        return 0.0
-
                 # 计算当前片段的持续时间
                 start_seconds = time_to_seconds(start_str)
                 end_seconds = time_to_seconds(end_str)
@@ -509,7 +628,8 @@ class ScriptProcessor:
             os.makedirs(os.path.dirname(file_name), exist_ok=True)
 
             with open(file_name, 'w', encoding='utf-8') as file:
-                json.dump(frame_content_list, file, ensure_ascii=False, indent=4)
+                # json.dump 边编码边写入文件，缩进2格减小文件体积
+                json.dump(frame_content_list, file, ensure_ascii=False, indent=2)
 
             logger.info(f"保存脚本成功，总时长: {format_timestamp(current_time)}")
 
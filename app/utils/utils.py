@@ -1,10 +1,13 @@
+import asyncio
 import locale
 import os
+import random
 import traceback
 
 import requests
 import threading
 from typing import Any
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 import streamlit as st
 import json
@@ -188,6 +191,165 @@ def run_in_background(func, *args, **kwargs):
     return thread
 
 
+def get_retry_delay(error: Exception, attempt: int, max_delay: float = 60) -> float:
+    """
+    计算失败请求的重试等待时间
+    优先使用服务端返回的 Retry-After 等响应头；没有响应头的限流错误（如 gRPC 返回的
+    ResourceExhausted）按配额窗口等待 max_delay；其他错误使用带随机抖动的指数退避
+    Args:
+        error: 请求抛出的异常，会沿异常链查找原始异常
+        attempt: 已失败的次数，从1开始
+        max_delay: 等待时间上限（秒）
+    Returns:
+        float: 等待秒数
+    """
+    rate_limited = False
+    while error is not None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+        if headers:
+            for key in ('Retry-After', 'X-RateLimit-Reset-After'):
+                try:
+                    return min(max_delay, max(0.0, float(headers.get(key))))
+                except (TypeError, ValueError):
+                    continue
+        # google.api_core 的异常通过 code，openai 的异常通过 status_code 给出 HTTP 状态码
+        if 429 in (getattr(error, 'code', None), getattr(error, 'status_code', None)):
+            rate_limited = True
+        error = error.__cause__ or error.__context__
+
+    if rate_limited:
+        return max_delay
+    return min(max_delay, 2 ** attempt + random.random())
+
+
+def wait_retry_after(retry_state) -> float:
+    """tenacity 等待策略，按 get_retry_delay 计算下一次重试前的等待时间"""
+    return get_retry_delay(retry_state.outcome.exception(), retry_state.attempt_number)
+
+
+def batch_retrying(batch_index: int, attempts: int = 3):
+    """
+    构建视觉分析单个批次的重试器，供各视觉分析器共用
+    参数错误（ValueError）不会因重试而恢复，直接抛出；其他异常按 wait_retry_after 等待后重试当前批次
+    Args:
+        batch_index: 批次序号，用于日志
+        attempts: 最多尝试次数
+    Returns:
+        AsyncRetrying: 用法为 async for attempt in batch_retrying(i): with attempt: ...
+    """
+    from tenacity import AsyncRetrying, stop_after_attempt, retry_if_not_exception_type
+
+    def log_retry(retry_state):
+        logger.error(f"批次 {batch_index} 处理出错: {str(retry_state.outcome.exception())}")
+        logger.info(f"批次 {batch_index} 处理失败，等待{retry_state.next_action.sleep:.1f}秒后重试当前批次...")
+
+    return AsyncRetrying(
+        stop=stop_after_attempt(attempts),
+        wait=wait_retry_after,
+        retry=retry_if_not_exception_type(ValueError),
+        before_sleep=log_retry,
+        reraise=True
+    )
+
+
+def load_image(img_path: str, max_edge: int = None):
+    """
+    加载单张图片并转换为RGB模式，失败时返回None
+    Args:
+        img_path: 图片路径
+        max_edge: 图片最长边上限，超出时等比缩小；为空时保持原尺寸
+    Returns:
+        PIL.Image.Image 或 None
+    """
+    import PIL.Image
+    import PIL.ImageOps
+
+    try:
+        if not os.path.exists(img_path):
+            logger.error(f"图片文件不存在: {img_path}")
+            return None
+
+        img = PIL.Image.open(img_path)
+        original_size = img.size
+        # JPEG 图片直接按缩小的比例解码，其他格式不受影响
+        if max_edge:
+            img.draft('RGB', (max_edge, max_edge))
+
+        if img.mode != 'RGB':
+            # 转换为RGB模式，转换时即完成解码，随后关闭原文件
+            with img:
+                img = img.convert('RGB')
+        else:
+            # 确保图片被完全加载
+            img.load()
+        # 等比缩小过大的图片，减少编码耗时和上传体积
+        # 缩小解码过的图片同样重新生成，使其不再关联尺寸不同的原文件
+        if max_edge and (max(img.size) > max_edge or img.size != original_size):
+            img = PIL.ImageOps.contain(img, (max_edge, max_edge), PIL.Image.Resampling.LANCZOS)
+        return img
+
+    except Exception as e:
+        logger.error(f"无法加载图片 {img_path}: {str(e)}")
+        return None
+
+
+async def load_image_batch(image_paths: list, max_edge: int = None, executor: ThreadPoolExecutor = None) -> list:
+    """
+    在线程池中并行加载一个批次的图片，保持原顺序，跳过加载失败的图片
+    PIL 解码和缩放时会释放 GIL，各图片可同时解码
+    """
+    loop = asyncio.get_running_loop()
+    loaded = await asyncio.gather(*(
+        loop.run_in_executor(executor, load_image, path, max_edge) for path in image_paths
+    ))
+    images = [img for img in loaded if img is not None]
+    if len(images) < len(image_paths):
+        logger.warning(f"批次中有 {len(image_paths) - len(images)} 张图片加载失败")
+    return images
+
+
+async def analyze_image_batches(images: list, batch_size: int, concurrency: int, analyze_batch,
+                                max_edge: int = None) -> list:
+    """
+    按批次并发分析图片，供各视觉分析器共用
+    images 为路径时，图片加载与请求分别限流：请求最多 concurrency 个同时进行，
+    加载最多领先一个批次，请求进行期间下一批次的图片已在加载，同时保留的图片不超过 concurrency + 1 个批次
+    Args:
+        images: 图片路径列表或PIL图片对象列表
+        batch_size: 每批次的图片数量
+        concurrency: 同时进行的请求数量
+        analyze_batch: 分析单个批次的协程函数，参数为 (batch_index, batch, batch_paths)，
+            batch_paths 在传入图片对象时为 None
+        max_edge: 加载图片时的最长边上限
+    Returns:
+        list: 各批次的结果，按批次顺序排列
+    """
+    from tqdm import tqdm
+
+    load_from_paths = isinstance(images[0], str)
+    request_semaphore = asyncio.Semaphore(concurrency)
+    load_semaphore = asyncio.Semaphore(concurrency + 1)
+    total_batches = (len(images) + batch_size - 1) // batch_size
+
+    with ThreadPoolExecutor() as executor, tqdm(total=total_batches, desc="分析进度") as pbar:
+        async def process_batch(i: int):
+            batch = images[i:i + batch_size]
+            batch_paths = batch if load_from_paths else None
+            # 信号量按等待顺序放行，批次按提交顺序加载和请求
+            async with load_semaphore:
+                if load_from_paths:
+                    batch = await load_image_batch(batch_paths, max_edge, executor)
+                async with request_semaphore:
+                    result = await analyze_batch(i // batch_size, batch, batch_paths)
+            pbar.update(1)
+            return result
+
+        # gather 按提交顺序返回结果，保持批次顺序
+        return list(await asyncio.gather(*(
+            process_batch(i) for i in range(0, len(images), batch_size)
+        )))
+
+
 def time_convert_seconds_to_hmsm(seconds) -> str:
     hours = int(seconds // 3600)
     seconds = seconds % 3600
@@ -623,7 +785,7 @@ def init_imagemagick():
     try:
         # 检查 ImageMagick 是否已安装
         import subprocess
-        result = subprocess.run(['magick', '-version'], capture_output=True, text=True)
+        result = subprocess.run(['magick', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
         if result.returncode != 0:
             logger.error("ImageMagick 未安装或配置不正确")
             return False
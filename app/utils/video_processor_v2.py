@@ -295,15 +295,19 @@ class VideoProcessor:
                 # 竖版视频
                 scale_filter = f'scale=-1:{compressed_width}'
             
+            # 压缩视频仅用于镜头检测，使用最快的编码预设并去掉音轨
             ffmpeg_cmd = [
-                'ffmpeg', '-i', self.video_path,
+                'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostats',
+                '-i', self.video_path,
                 '-vf', scale_filter,
+                '-c:v', 'libx264', '-preset', 'ultrafast',
+                '-an',
                 '-y',
                 compressed_video
             ]
             
             try:
-                subprocess.run(ffmpeg_cmd, check=True, capture_output=True, text=True)
+                subprocess.run(ffmpeg_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
             except subprocess.CalledProcessError as e:
                 logger.error(f"FFmpeg 错误输出: {e.stderr}")
                 raise
@@ -23,13 +23,18 @@ def create_vision_analyzer(provider, api_key, model, base_url):
         VisionAnalyzer 或 QwenAnalyzer 实例
     """
     if provider == 'gemini':
-        return gemini_analyzer.VisionAnalyzer(model_name=model, api_key=api_key)
+        return gemini_analyzer.VisionAnalyzer(
+            model_name=model,
+            api_key=api_key,
+            concurrency=config.frames.get("vision_concurrency", 3)
+        )
     elif provider == 'qwenvl':
         # 只传入必要的参数
         return qwenvl_analyzer.QwenAnalyzer(
             model_name=model, 
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            concurrency=config.frames.get("vision_concurrency", 3)
         )
     else:
         raise ValueError(f"不支持的视觉分析提供商: {provider}")
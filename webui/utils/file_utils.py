@@ -3,10 +3,20 @@ import glob
 import time
 import platform
 import shutil
+import subprocess
 from uuid import uuid4
 from loguru import logger
 from app.utils import utils
 
+# 运行期间操作系统不会变化，导入时确定一次
+_SYSTEM = platform.system()
+
+# 各平台打开文件夹使用的命令，Windows 使用 os.startfile
+FOLDER_OPENERS = {
+    'Darwin': 'open',
+    'Linux': 'xdg-open',
+}
+
 def open_task_folder(root_dir, task_id):
     """打开任务文件夹
     Args:
@@ -14,15 +24,13 @@ def open_task_folder(root_dir, task_id):
         task_id: 任务ID
     """
     try:
-        sys = platform.system()
         path = os.path.join(root_dir, "storage", "tasks", task_id)
         if os.path.exists(path):
-            if sys == 'Windows':
-                os.system(f"start {path}")
-            if sys == 'Darwin':
-                os.system(f"open {path}")
-            if sys == 'Linux':
-                os.system(f"xdg-open {path}")
+            # 直接调用系统命令，不经过 shell，路径含空格时也能正确打开
+            if _SYSTEM == 'Windows':
+                os.startfile(path)
+            elif _SYSTEM in FOLDER_OPENERS:
+                subprocess.Popen([FOLDER_OPENERS[_SYSTEM], path])
     except Exception as e:
         logger.error(f"打开任务文件夹失败: {e}")
 
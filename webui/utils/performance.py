@@ -1,7 +1,24 @@
 import psutil
 import os
+import platform
+from functools import lru_cache
 from loguru import logger
-import torch
+
+
+@lru_cache(maxsize=1)
+def _cuda_available() -> bool:
+    """检测 CUDA 是否可用，硬件在运行期间不会变化，只检测一次"""
+    # macOS 不支持 CUDA，无需导入 torch 即可确定
+    if platform.system() == "Darwin":
+        return False
+    # torch 导入耗时较长，仅在实际使用时导入；torch 为可选依赖，未安装时视为不可用
+    try:
+        import torch
+    except ImportError:
+        logger.debug("未安装 torch，跳过 GPU 监控")
+        return False
+    return torch.cuda.is_available()
+
 
 class PerformanceMonitor:
     @staticmethod
@@ -11,13 +28,15 @@ class PerformanceMonitor:
         
         logger.debug(f"Memory usage: {memory_info.rss / 1024 / 1024:.2f} MB")
         
-        if torch.cuda.is_available():
+        if _cuda_available():
+            import torch
             gpu_memory = torch.cuda.memory_allocated() / 1024 / 1024
             logger.debug(f"GPU Memory usage: {gpu_memory:.2f} MB")
     
     @staticmethod
     def cleanup_resources():
-        if torch.cuda.is_available():
+        if _cuda_available():
+            import torch
             torch.cuda.empty_cache()
         
         import gc
@@ -1,5 +1,6 @@
 import logging
 from typing import List, Dict, Any, Optional
+from app.config import config
 from app.utils import gemini_analyzer, qwenvl_analyzer
 
 logger = logging.getLogger(__name__)
@@ -27,7 +28,8 @@ class VisionAnalyzer:
         self.base_url = base_url
         self.analyzer = gemini_analyzer.VisionAnalyzer(
             model_name=model,
-            api_key=api_key
+            api_key=api_key,
+            concurrency=config.frames.get("vision_concurrency", 3)
         )
 
     def initialize_qwenvl(self, api_key: str, model: str, base_url: str) -> None:
@@ -45,7 +47,8 @@ class VisionAnalyzer:
         self.base_url = base_url
         self.analyzer = qwenvl_analyzer.QwenAnalyzer(
             model_name=model,
-            api_key=api_key
+            api_key=api_key,
+            concurrency=config.frames.get("vision_concurrency", 3)
         )
         
     async def analyze_images(self, images: List[str], prompt: str, batch_size: int = 5) -> Dict[str, Any]: